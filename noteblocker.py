@@ -299,6 +299,9 @@ class NoteBlockStructureGenerator:
         self.structures = []
         self.command_delay = 0.0
         self.server_instance = None
+        self.deduplicate = True
+        self.max_polyphony = None
+        self.blocks_saved = 0
         self.line1 = "black_wool"
         self.line2 = "black_wool"
         self.studs = ["red_wool", "orange_wool", "yellow_wool", "lime_wool", "light_blue_wool", "cyan_wool", "blue_wool", "purple_wool", "magenta_wool"]
@@ -310,20 +313,55 @@ class NoteBlockStructureGenerator:
             3: "east"
         }
 
+    def resolve_note(self, message):
+        inst = MidiTranslationManager.get_instrument(message.instrument) if not message.is_percussion else MidiTranslationManager.get_percussion(message.note)
+        note = message.note if not message.is_percussion else 48
+        return (inst, MidiTranslationManager.note_block_pitch(note))
+
+    def limit_polyphony(self, tick):
+        # keep the top (melody) and bottom (bass) notes first, then percussion, then the inner voices from the top down
+        melodic = sorted([x for x in tick if not x.is_percussion], key=lambda x: x.note, reverse=True)
+        percussion = [x for x in tick if x.is_percussion]
+        priority = melodic[:1] + melodic[1:][-1:] + percussion + melodic[1:-1]
+        kept = set(priority[:self.max_polyphony])
+        return [x for x in tick if x in kept]
+
+    def reduce_tick(self, tick):
+        output = tick
+        if self.deduplicate: # notes that end up as the same instrument and pitch sound identical in game
+            seen = set()
+            output = []
+            for x in tick:
+                key = self.resolve_note(x)
+                if key in seen:
+                    continue
+                seen.add(key)
+                output.append(x)
+        if self.max_polyphony != None and len(output) > self.max_polyphony:
+            output = self.limit_polyphony(output)
+        self.blocks_saved += len(tick) - len(output)
+        return output
+
     def generate(self):
-        biggest_frame = max([len([y for y in x if y.note != None]) for x in self.messages])
-        lanes = [NoteBlockLane() for x in range(0, math.ceil(biggest_frame / 3))]
         time = -0.1
         current_items = [item for sublist in self.messages.copy() for item in sublist]
         current_items = [item for item in current_items if item.note != None]
         max_time = max([item.leading_delay for item in current_items])
+        ticks = []
+        self.blocks_saved = 0
         while not (time > max_time):
             time += 0.1
             tick = []
             for x in current_items:
                 if time > x.leading_delay and x.note != None:
                     tick.append(x)
-            lane_number = 0
+            for x in tick:
+                current_items.remove(x)
+            ticks.append(self.reduce_tick(tick))
+
+        biggest_frame = max([len(x) for x in ticks])
+        lanes = [NoteBlockLane() for x in range(0, math.ceil(biggest_frame / 3))]
+        for tick in ticks:
             notes_lanes = [tick[x:x+3] for x in range(0, len(tick), 3)]
             if len(notes_lanes) != 0:
                 for x in range(0, len(lanes)):
@@ -331,8 +369,6 @@ class NoteBlockStructureGenerator:
                         lanes[x].add_stud()
                         continue
                     lanes[x].add_blocks(notes_lanes[x])
-            for x in tick:
-                current_items.remove(x)
             for x in lanes:
                 x.add_repeater(1)
 
@@ -341,7 +377,8 @@ class NoteBlockStructureGenerator:
     def place_block(self, x, y, z, block):
         #print("setblock %s %s %s %s" % (x, y, z, block))
         self.server_instance.send_command("setblock %s %s %s %s" % (x, y, z, block))
-        time.sleep(self.command_delay)
+        if self.command_delay > 0:
+            time.sleep(self.command_delay)
             
     def build(self, server_instance, x_pos, y_pos, z_pos, direction):
         print('direction is ' + str(direction))
@@ -350,6 +387,8 @@ class NoteBlockStructureGenerator:
         forward_z = 0 if direction % 2 != 0 else 2 - direction - 1
         sideways_x = 0 - forward_z if direction % 2 == 0 else forward_z
         sideways_z = 0 - forward_x if direction % 2 == 0 else forward_x
+        repeaters = dict([(x, "repeater[facing=%s,delay=%s]" % (self.facing[direction], x)) for x in range(1, 5)])
+        note_blocks = {} # (instrument, note, is_percussion) -> (material, note block state)
 
         border_x = x_pos
         border_z = z_pos
@@ -373,7 +412,7 @@ class NoteBlockStructureGenerator:
                     item = lane.objects[x]
                     if (item[0] == "repeater"):
                         self.place_block(lane_x, y_pos + 1, lane_z, "iron_block")
-                        self.place_block(lane_x, y_pos + 2, lane_z, "repeater[facing=%s,delay=%s]" % (self.facing[direction], item[1]))
+                        self.place_block(lane_x, y_pos + 2, lane_z, repeaters[item[1]])
                     if (item[0] == "stud"):
                         self.place_block(lane_x, y_pos + 2, lane_z, self.studs[(math.floor(x / 2) + y) % len(self.studs)])
                     if (item[0] == "blocks"):
@@ -383,14 +422,15 @@ class NoteBlockStructureGenerator:
                             start_x = start_x + sideways_x * -1
                             start_z = start_z + sideways_z * -1
                         for z in item[1]:
-                            inst = MidiTranslationManager.get_instrument(z.instrument) if not z.is_percussion else MidiTranslationManager.get_percussion(z.note)
-                            note = z.note if not z.is_percussion else 48
-                            pitch = MidiTranslationManager.note_block_pitch(note)
-                            material = MidiTranslationManager.get_block(inst)
+                            key = (z.instrument, z.note, z.is_percussion)
+                            if not key in note_blocks:
+                                inst, pitch = self.resolve_note(z)
+                                note_blocks[key] = (MidiTranslationManager.get_block(inst), "note_block[note=" + str(pitch) + ("," + "instrument=" + inst if inst != "piano" else "") + "]")
+                            material, note_block = note_blocks[key]
                             if material in ["sand", "gravel"]:
                                 self.place_block(start_x, y_pos, start_z, "iron_block")
                             self.place_block(start_x, y_pos + 1, start_z, material)
-                            self.place_block(start_x, y_pos + 2, start_z, "note_block[note=" + str(pitch) + ("," + "instrument=" + inst if inst != "piano" else "") + "]")
+                            self.place_block(start_x, y_pos + 2, start_z, note_block)
                             start_x = start_x + sideways_x 
                             start_z = start_z + sideways_z
 
@@ -507,6 +547,8 @@ class NoteblockerCI:
         self.pythonw = "pythonw" in os.path.split(sys.executable)[1]
         self.tempo_modifier = 1.0
         self.channel10 = True
+        self.deduplicate = True
+        self.max_polyphony = None
         self.facing_repeaterfix = {
             0: "north",
             1: "east",
@@ -589,6 +631,8 @@ class NoteblockerCI:
             print("nbgen (x) (y) (z) (direction - north/east/south/west) - generates a noteblock sequence. a path will be prompted later. you can if you want but do not need to provide coords/direction. make sure that area of the world is loaded!")
             print("repeaterfix <on/off> - in 1.13.1 there is a bug that causes repeaters to place facing the wrong direction. this toggles a fix for this. [on by default]")
             print("tempomod (float) - edits the tempo modifier [default 1.0]")
+            print("dedupe <on/off> - skips notes on the same tick that would become the same instrument and pitch. [on by default]")
+            print("polyphony (int/off) - limits how many notes can play on one tick, keeping the melody and bass first. [off by default]")
         if q.strip().startswith('/'):
             self.minecraft_server.send_command(q.strip()[1:])
         if command[0] == "repeaterfix":
@@ -608,6 +652,31 @@ class NoteblockerCI:
                 return
             self.tempo_modifier = mod
             print("changed the tempo modifier to " + str(self.tempo_modifier))
+        if command[0] == "dedupe":
+            on = self.try_get_arg(command, 1, str)
+            if on == None:
+                print('dedupe is ' + ('on.' if self.deduplicate else 'off.'))
+                return
+            if not (on.strip().lower() in ['on', 'off']):
+                print('please provide ON or OFF.')
+                return
+            self.deduplicate = on.strip().lower() == 'on'
+            print("changed the state of dedupe.")
+        if command[0] == "polyphony":
+            limit = self.try_get_arg(command, 1, str)
+            if limit == None:
+                print('the polyphony limit is ' + (str(self.max_polyphony) if self.max_polyphony != None else 'off'))
+                return
+            if limit.strip().lower() == 'off':
+                self.max_polyphony = None
+                print("turned off the polyphony limit.")
+                return
+            limit = self.try_get_arg(command, 1, int)
+            if limit == None or limit < 1:
+                print('please provide a number above 0 or OFF.')
+                return
+            self.max_polyphony = limit
+            print("changed the polyphony limit to " + str(self.max_polyphony))
         if command[0] == "nbgen":
             x = self.try_get_arg(command, 1, int)
             y = self.try_get_arg(command, 2, int)
@@ -642,8 +711,11 @@ class NoteblockerCI:
             g = NoteBlockStructureGenerator(c.noteblock)
             if (self.repeaterfix):
                 g.facing = self.facing_repeaterfix
+            g.deduplicate = self.deduplicate
+            g.max_polyphony = self.max_polyphony
             print('generating structure')
             g.generate()
+            print('saved ' + str(g.blocks_saved) + ' note blocks')
             print('starting minecraft server')
             print('building blocks..')
             self.minecraft_server.logging_disabled = True